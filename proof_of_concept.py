@@ -3,8 +3,17 @@ import json
 import numpy as np
 import pickle
 import os
-from sklearn.metrics.pairwise import cosine_similarity
+import contextlib
+import zipfile
+import zlib
+import platform
+import torch
+import torch.nn.functional as F
+import onnxruntime as ort
+import simsimd as simd
 from sentence_transformers import SentenceTransformer
+from transformers import AutoTokenizer, PreTrainedTokenizerFast
+from scoring import hybrid_score
 import datetime
 
 # ----------------------------
@@ -19,6 +28,8 @@ st.set_page_config(page_title="Internship Recommender", page_icon="🎯", layout
 try:
     with open("internship.json", "r", encoding="utf-8") as f:
         internships = json.load(f)
+    # Keys the cached recommendations to the data file
+    data_mtime = os.path.getmtime("internship.json")
 except FileNotFoundError:
     st.error("Error: 'internship.json' file not found. Please make sure the file is in the same directory as the script.")
     st.stop()
@@ -30,49 +41,200 @@ except json.JSONDecodeError:
 # ----------------------------
 # Load SBERT Model
 # ----------------------------
+SBERT_MODEL = "all-mpnet-base-v2"
+# ONNX Runtime with a dynamically quantized graph encodes several times faster
+# on CPU; set SBERT_BACKEND=torch to run the PyTorch model instead.
+DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+SBERT_BACKEND = os.environ.get("SBERT_BACKEND", "torch" if DEVICE == "cuda" else "onnx")
+if platform.machine().lower() in ("arm64", "aarch64"):
+    ONNX_FILE = "onnx/model_qint8_arm64.onnx"
+else:
+    ONNX_FILE = "onnx/model_quint8_avx2.onnx"
+# The default intra-op pool oversubscribes many-core CPUs on short single-sentence encodes
+SBERT_THREADS = int(os.environ.get("SBERT_THREADS", min(4, os.cpu_count() or 1)))
+
+
 @st.cache_resource
 def load_model():
-    return SentenceTransformer("all-mpnet-base-v2")
+    torch.set_num_threads(SBERT_THREADS)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # only settable once per process, before any inter-op work
+
+    if SBERT_BACKEND == "onnx":
+        # ONNX Runtime ignores torch's thread settings and sizes its own pools
+        session_options = ort.SessionOptions()
+        session_options.intra_op_num_threads = SBERT_THREADS
+        session_options.inter_op_num_threads = 1
+        m = SentenceTransformer(
+            SBERT_MODEL, device=DEVICE, backend="onnx",
+            model_kwargs={"file_name": ONNX_FILE, "session_options": session_options},
+        )
+    else:
+        m = SentenceTransformer(SBERT_MODEL, device=DEVICE)
+        if DEVICE == "cuda":
+            m.half()  # fp16 halves memory traffic; cosine ranking is unaffected
+
+    # Tokenizing is a large share of a single-title encode; make sure the Rust tokenizer is used
+    if not isinstance(m.tokenizer, PreTrainedTokenizerFast):
+        m.tokenizer = AutoTokenizer.from_pretrained(f"sentence-transformers/{SBERT_MODEL}", use_fast=True)
+    m.eval()
+    return m
 
 model = load_model()
 
 
+def _cpu_supports_bf16():
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+# bf16 autocast only pays off on CPUs with native bf16 (AVX-512 BF16 / AMX)
+use_cpu_bf16 = SBERT_BACKEND == "torch" and DEVICE == "cpu" and _cpu_supports_bf16()
+
+# Identifies how cached corpus vectors were produced; a change invalidates the cache
+if SBERT_BACKEND == "onnx":
+    encoder_backend = f"onnx:{ONNX_FILE}"
+elif DEVICE == "cuda":
+    encoder_backend = "torch:fp16"
+else:
+    encoder_backend = "torch:bf16" if use_cpu_bf16 else "torch:fp32"
+
+
+def _autocast():
+    """bf16 autocast on CPUs that support it natively, otherwise a no-op."""
+    if use_cpu_bf16:
+        return torch.autocast("cpu", dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+
+def encode(texts, **kwargs):
+    """
+    Runs model.encode without autograd bookkeeping, under bf16 autocast
+    on CPUs that support it natively.
+    """
+    with torch.inference_mode(), _autocast():
+        return model.encode(texts, **kwargs)
+
+
 # ----------------------------
 # Create / Update Embeddings
 # ----------------------------
-def create_or_update_embeddings(internships, cache_file="embeddings_cache.json"):
+def _load_embeddings_cache(cache_file, legacy_cache_file, dim):
     """
-    Creates or updates a cache of internship embeddings.
-    Only new internships are embedded to save time.
+    Loads cached embeddings as a float32 matrix together with the
+    internship_id -> row index mapping. A cache written by a different
+    model, backend or embedding width is treated as stale and re-encoded.
+    Falls back to the legacy JSON cache when the .npz does not exist yet;
+    those vectors came from the plain fp32 PyTorch model, so they are only
+    reused on that backend and only rows of the expected width are kept.
     """
-    cache = {}
     if os.path.exists(cache_file):
-        with open(cache_file, "r", encoding="utf-8") as f:
+        try:
+            with np.load(cache_file) as data:
+                ids, matrix = data["ids"], data["mat"]
+                encoder = (str(data["model"]), str(data["backend"]), int(data["dim"]))
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile, zlib.error):
+            st.warning("Corrupted embeddings cache, recreating...")
+            return None, {}
+        if matrix.ndim != 2 or len(ids) != matrix.shape[0]:
+            st.warning("Corrupted embeddings cache, recreating...")
+            return None, {}
+        if encoder != (SBERT_MODEL, encoder_backend, dim) or matrix.shape[1] != dim:
+            st.warning("Embeddings cache was built with a different encoder, recreating...")
+            return None, {}
+        return matrix, {str(iid): row for row, iid in enumerate(ids)}
+
+    if os.path.exists(legacy_cache_file) and encoder_backend == "torch:fp32":
+        with open(legacy_cache_file, "r", encoding="utf-8") as f:
             try:
                 cache = json.load(f)
             except json.JSONDecodeError:
                 st.warning("Corrupted embeddings cache, recreating...")
                 cache = {}
+        cache = {iid: vec for iid, vec in cache.items() if len(vec) == dim}
+        if cache:
+            matrix = np.array(list(cache.values()), dtype=np.float32)
+            return matrix, {iid: row for row, iid in enumerate(cache)}
+
+    return None, {}
 
-    updated = False
+
+def quantize_int8(vectors):
+    """
+    Scales each row so its largest component maps to 127 and rounds to int8.
+    Cosine similarity is scale-invariant, so the per-row scale is not kept.
+    """
+    vectors = np.atleast_2d(vectors)
+    scale = 127.0 / np.abs(vectors).max(axis=1, keepdims=True)
+    return np.round(vectors * scale).clip(-127, 127).astype(np.int8)
+
+
+@st.cache_resource
+def create_or_update_embeddings(internships, cache_file="embeddings.npz",
+                                legacy_cache_file="embeddings_cache.json"):
+    """
+    Creates or updates a cache of internship embeddings.
+    Only new internships are embedded to save time.
+    Vectors are stored as a compressed .npz holding the internship ids,
+    a float32 matrix with one row per id, and the model, backend and
+    dimension that produced them.
+    Returns the scoring copy of the normalized vectors as (int8, gpu):
+    an fp16 tensor resident on the GPU when CUDA is available, otherwise
+    an int8 matrix for SimSIMD (the unused one is None). The float32
+    matrix is only an intermediate and is not kept.
+    """
+    dim = model.get_sentence_embedding_dimension()
+    cached, id_to_row = _load_embeddings_cache(cache_file, legacy_cache_file, dim)
+
+    missing_texts = []
     for internship in internships:
         iid = str(internship["internship_id"])
-        if iid not in cache:
+        if iid not in id_to_row:
             # Create a comprehensive text for embedding
             text = f"{internship['title']} {internship['organization']} {internship.get('description', '')} {internship.get('skills', '')}"
-            embedding = model.encode(text).tolist()
-            cache[iid] = embedding
-            updated = True
-
-    if updated:
-        with open(cache_file, "w", encoding="utf-8") as f:
-            json.dump(cache, f)
-
-    # Convert cached embeddings to a numpy matrix
-    embeddings_matrix = np.array([cache[str(i["internship_id"])] for i in internships])
-    return embeddings_matrix
+            id_to_row[iid] = len(id_to_row)
+            missing_texts.append(text)
+
+    matrix = cached
+    if missing_texts:
+        # One batched call lets SBERT pad per minibatch instead of per sentence
+        new_rows = encode(
+            missing_texts, batch_size=64, show_progress_bar=False,
+            convert_to_numpy=True, normalize_embeddings=True,
+        ).astype(np.float32)
+        matrix = new_rows if cached is None else np.concatenate([cached, new_rows])
+
+    if matrix is None:
+        # No cached vectors and no internships to encode: nothing to persist
+        matrix = np.empty((0, dim), dtype=np.float32)
+    elif missing_texts or not os.path.exists(cache_file):
+        # id_to_row preserves insertion order, so its keys line up with the rows.
+        # Write to a temp file and swap it in, so an interrupted write never
+        # leaves a truncated cache behind.
+        tmp_file = cache_file + ".tmp"
+        with open(tmp_file, "wb") as f:
+            np.savez_compressed(
+                f, ids=np.array(list(id_to_row)), mat=matrix.astype(np.float32),
+                model=SBERT_MODEL, backend=encoder_backend, dim=dim,
+            )
+        os.replace(tmp_file, cache_file)
+
+    # Gather rows in internship order into a contiguous float32 matrix
+    rows = [id_to_row[str(i["internship_id"])] for i in internships]
+    embeddings_matrix = np.ascontiguousarray(matrix[rows], dtype=np.float32)
+    # Normalize once so a query only needs a single dot product per row
+    embeddings_matrix /= np.linalg.norm(embeddings_matrix, axis=1, keepdims=True)
+    embeddings_int8 = embeddings_gpu = None
+    if DEVICE == "cuda":
+        embeddings_gpu = F.normalize(torch.from_numpy(embeddings_matrix).to(DEVICE).half(), dim=1)
+    else:
+        embeddings_int8 = quantize_int8(embeddings_matrix)
+    return embeddings_int8, embeddings_gpu
 
-internship_embeddings = create_or_update_embeddings(internships)
+internship_embeddings_int8, internship_embeddings_gpu = create_or_update_embeddings(internships)
 
 
 # ----------------------------
@@ -95,60 +257,121 @@ def parse_stipend(stipend_str):
 
 
 # ----------------------------
-# Recommendation Function
+# Precompute Filter Columns
 # ----------------------------
-def recommend_internships(title, location, duration, stipend_min, stipend_max, top_k=3):
-    """
-    Recommends internships based on a hybrid scoring system.
-    Combines semantic similarity with boosts for filters.
-    """
-    candidate_embedding = model.encode(title).reshape(1, -1)
-    similarities = cosine_similarity(candidate_embedding, internship_embeddings)[0]
+def normalize_duration(duration_str):
+    """Strips the unit so "6 Months" and "6" compare equal."""
+    return duration_str.lower().replace("months", "").strip()
 
-    adjusted_scores = []
-    for idx, sim in enumerate(similarities):
-        internship = internships[idx]
-        score = sim  # base similarity
 
-        # ✅ Location boost
-        if location != "Any" and location.lower() in internship["location"].lower():
-            score += 0.15
+def parse_apply_by(apply_by_str):
+    """Parses an apply-by date like "04-Sep-2025" to a day ordinal, or -1 if invalid."""
+    try:
+        return datetime.datetime.strptime(apply_by_str, "%d-%b-%Y").date().toordinal()
+    except (ValueError, TypeError):
+        return -1
 
-        # ✅ Duration boost
-        if duration != "Any" and duration.lower().replace("months", "").strip() in internship["duration"].lower().replace("months", "").strip():
-            score += 0.05
 
-        # ✅ Stipend boost
-        stipend_value = parse_stipend(internship["stipend"])
-        if stipend_min <= stipend_value <= stipend_max:
-            score += 0.10
+@st.cache_resource
+def build_filter_columns(internships):
+    """
+    Precomputes the per-internship columns used by the filter boosts,
+    so a query only runs vectorized NumPy ops over them.
+    Location and duration matches are precomputed for every dropdown value
+    ("Any" matches nothing), so queries do no string work at all.
+    Also returns those values, sorted, as the dropdown options.
+    """
+    location_arr = np.array([i["location"].lower() for i in internships])
+    duration_arr = np.array([normalize_duration(i["duration"]) for i in internships])
+    no_match = np.zeros(len(internships), dtype=np.bool_)
+    locations = sorted({i["location"] for i in internships})
+    durations = sorted({i["duration"] for i in internships})
+    location_masks = {"Any": no_match}
+    for loc in locations:
+        location_masks[loc] = np.char.find(location_arr, loc.lower()) >= 0
+    duration_masks = {"Any": no_match}
+    for dur in durations:
+        duration_masks[dur] = np.char.find(duration_arr, normalize_duration(dur)) >= 0
+    stipend_arr = np.array([parse_stipend(i["stipend"]) for i in internships], dtype=np.int32)
+    apply_by_ord = np.array([parse_apply_by(i["apply_by"]) for i in internships], dtype=np.int32)
+    return locations, durations, location_masks, duration_masks, stipend_arr, apply_by_ord
+
+(locations, durations, location_masks, duration_masks,
+ stipend_arr, apply_by_ord) = build_filter_columns(internships)
 
-        # ✅ Recency boost for upcoming deadlines
-        try:
-            apply_by = datetime.datetime.strptime(internship["apply_by"], "%d-%b-%Y").date()
-            days_left = (apply_by - datetime.date.today()).days
-            if 0 < days_left <= 30:
-                recency_factor = (30 - days_left) / 30.0
-                score += 0.10 * recency_factor
-        except (ValueError, TypeError):
-            pass
 
-        adjusted_scores.append(score)
+# ----------------------------
+# Encode Candidate Title
+# ----------------------------
+# Titles are short, so the query path truncates at 32 tokens; corpus texts keep the model default
+TITLE_MAX_SEQ_LENGTH = 32
+
 
-    top_indices = np.argsort(adjusted_scores)[::-1][:top_k]
-    top_results = [(internships[i], adjusted_scores[i]) for i in top_indices]
+@st.cache_data(max_entries=1024, show_spinner=False)
+def _encode_title(title):
+    """Encodes a normalized title; repeated titles skip the model entirely."""
+    features = model.tokenizer(
+        [title], padding=True, truncation=True,
+        max_length=TITLE_MAX_SEQ_LENGTH, return_tensors="pt",
+    )
+    features = {k: v.to(model.device) for k, v in features.items()}
+    with torch.inference_mode(), _autocast():
+        embedding = model(features)["sentence_embedding"]
+    return F.normalize(embedding.float(), dim=1)[0].cpu().numpy()
 
-    best_score = top_results[0][1] if top_results else 0
+
+# ----------------------------
+# Recommendation Function
+# ----------------------------
+@st.cache_data(max_entries=256, show_spinner=False)
+def recommend_internships(title, location, duration, stipend_min, stipend_max,
+                          data_mtime, today, top_k=3):
+    """
+    Recommends internships based on a hybrid scoring system.
+    Combines semantic similarity with boosts for filters.
+    Results are memoized per input combination; ``data_mtime`` ties them to
+    the current internship.json and ``today`` (a date ordinal) to the recency boost.
+    """
+    if not internships:
+        return "no_results", np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+
+    candidate_embedding = _encode_title(title.strip().lower())
+    if internship_embeddings_gpu is not None:
+        # fp16 tensor-core GEMV against the GPU-resident corpus; only the query crosses the bus
+        q = F.normalize(torch.from_numpy(candidate_embedding).to(DEVICE).half(), dim=0)
+        similarities = (internship_embeddings_gpu @ q).float().cpu().numpy()
+    else:
+        # int8 vectors move a quarter of the bytes and hit SimSIMD's VNNI/SDOT kernels;
+        # SimSIMD returns cosine distances, so convert back to similarities
+        similarities = 1.0 - np.asarray(
+            simd.cdist(quantize_int8(candidate_embedding), internship_embeddings_int8, metric="cos"),
+            dtype=np.float32,
+        ).ravel()
+
+    # ✅ Location, duration, stipend and recency boosts, fused into one pass
+    scores = hybrid_score(
+        similarities, location_masks[location], duration_masks[duration],
+        stipend_arr, stipend_min, stipend_max,
+        apply_by_ord, today,
+    )
+
+    # Partial selection is O(N); only the top_k survivors get sorted
+    top_k = min(top_k, len(scores))
+    top_indices = np.argpartition(-scores, top_k - 1)[:top_k]
+    top_indices = top_indices[np.argsort(-scores[top_indices])]
+    top_scores = scores[top_indices]
+
+    best_score = top_scores[0] if len(top_scores) else 0
 
     # -------------------------
     # ✅ Suggestion Rules
     # -------------------------
     if best_score < 0.30:  # <-- Changed from 0.20 to 0.30
-        return "no_results", []
+        return "no_results", top_indices[:0], top_scores[:0]
     elif best_score < 0.45:
-        return "suggestion", top_results
+        return "suggestion", top_indices, top_scores
     else:
-        return "results", top_results
+        return "results", top_indices, top_scores
 
 
 # ----------------------------
@@ -194,10 +417,7 @@ st.markdown('<div class="header-container">🎯 Internship Recommender System</d
 
 st.write("Find the best internships tailored to your preferences 🚀")
 
-# Dropdown Options
-locations = sorted(list(set([i["location"] for i in internships])))
-durations = sorted(list(set([i["duration"] for i in internships])))
-
+# Dropdown Options (locations and durations come from build_filter_columns)
 stipend_ranges = [
     "Any",
     "Unpaid",
@@ -236,13 +456,32 @@ elif stipend_choice == "20001+":
     stipend_min, stipend_max = 20001, 999999
 
 
+# Result Card
+def render_card(i, score):
+    """Renders the card for internships[i] with its match score."""
+    internship = internships[i]
+    stipend_css_class = "stipend-paid" if stipend_arr[i] > 0 else "stipend-unpaid"
+    st.markdown(f"""
+<div class="internship-card">
+    <h3 class="card-title">{internship['title']}</h3>
+    <p>🏢 <b>Organization:</b> {internship['organization']}</p>
+    <p>📍 <b>Location:</b> {internship['location']}</p>
+    <p>⏳ <b>Duration:</b> {internship['duration']}</p>
+    <p><span class="{stipend_css_class}">💰 <b>Stipend:</b> {internship['stipend']}</span></p>
+    <p>🗓 <b>Apply By:</b> {internship['apply_by']}</p>
+    <p>⭐ <b>Match Score:</b> {score:.3f}</p>
+</div>
+""", unsafe_allow_html=True)
+
+
 # Button Action
 if st.button("🔍 Find Internships"):
     if not title.strip():
         st.warning("Please enter a preferred role or title to get started.")
     else:
-        status, results = recommend_internships(
-            title, location, duration, stipend_min, stipend_max, top_k=3
+        status, indices, scores = recommend_internships(
+            title, location, duration, stipend_min, stipend_max,
+            data_mtime, datetime.date.today().toordinal(), top_k=3,
         )
         
         st.subheader("💡 Your Top Matches")
@@ -252,31 +491,9 @@ if st.button("🔍 Find Internships"):
         
         elif status == "suggestion":
             st.warning(f"🤔 We found some potential matches, but they might not be perfect. Here are the closest results:")
-            for internship, score in results:
-                stipend_css_class = "stipend-paid" if parse_stipend(internship['stipend']) > 0 else "stipend-unpaid"
-                st.markdown(f"""
-<div class="internship-card">
-    <h3 class="card-title">{internship['title']}</h3>
-    <p>🏢 <b>Organization:</b> {internship['organization']}</p>
-    <p>📍 <b>Location:</b> {internship['location']}</p>
-    <p>⏳ <b>Duration:</b> {internship['duration']}</p>
-    <p><span class="{stipend_css_class}">💰 <b>Stipend:</b> {internship['stipend']}</span></p>
-    <p>🗓 <b>Apply By:</b> {internship['apply_by']}</p>
-    <p>⭐ <b>Match Score:</b> {score:.3f}</p>
-</div>
-""", unsafe_allow_html=True)
+            for i, score in zip(indices, scores):
+                render_card(i, score)
         
         else:  # normal results
-            for internship, score in results:
-                stipend_css_class = "stipend-paid" if parse_stipend(internship['stipend']) > 0 else "stipend-unpaid"
-                st.markdown(f"""
-<div class="internship-card">
-    <h3 class="card-title">{internship['title']}</h3>
-    <p>🏢 <b>Organization:</b> {internship['organization']}</p>
-    <p>📍 <b>Location:</b> {internship['location']}</p>
-    <p>⏳ <b>Duration:</b> {internship['duration']}</p>
-    <p><span class="{stipend_css_class}">💰 <b>Stipend:</b> {internship['stipend']}</span></p>
-    <p>🗓 <b>Apply By:</b> {internship['apply_by']}</p>
-    <p>⭐ <b>Match Score:</b> {score:.3f}</p>
-</div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+            for i, score in zip(indices, scores):
+                render_card(i, score)
@@ -0,0 +1,30 @@
+import numpy as np
+from numba import njit
+
+
+# ----------------------------
+# Hybrid Scoring Kernel
+# ----------------------------
+# Lives outside proof_of_concept.py so the compiled Numba dispatcher stays in
+# sys.modules; Streamlit re-executes the app script (and would re-decorate it)
+# on every rerun.
+# Serial on purpose: with ~100s of rows, spinning up a prange thread pool costs more
+# than the loop itself and would fight the SBERT_THREADS limit
+@njit(fastmath=True, cache=True)
+def hybrid_score(sims, loc_ok, dur_ok, stipend, stipend_min, stipend_max, apply_by_ord, today):
+    """
+    Adds the filter and recency boosts to the similarities in one compiled pass,
+    reading the raw stipend and apply-by columns so no per-query temporaries are built.
+    """
+    out = np.empty_like(sims)
+    for i in range(sims.shape[0]):
+        s = sims[i] + 0.15 * loc_ok[i] + 0.05 * dur_ok[i]
+        if stipend_min <= stipend[i] <= stipend_max:
+            s += 0.10
+        # Unparseable dates are stored as -1 and get no boost
+        if apply_by_ord[i] > 0:
+            dl = apply_by_ord[i] - today
+            if 0 < dl <= 30:
+                s += 0.10 * (30 - dl) / 30.0
+        out[i] = s
+    return out